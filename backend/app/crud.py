@@ -1,6 +1,11 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session, joinedload
-from typing import List, Optional
+from typing import Deque, Dict, Iterable, List, Optional, Tuple, Union
 from . import models, schemas
+from .database import SessionLocal, is_sharded, route_to_project, route_to_task
 
 
 # Project CRUD
@@ -14,6 +19,7 @@ def create_project(db: Session, project: schemas.ProjectCreate) -> models.Projec
     db.add(db_project)
     db.commit()
     db.refresh(db_project)
+    route_to_project(db, db_project.id, create=True)
     return db_project
 
 
@@ -45,6 +51,7 @@ def delete_project(db: Session, project_id: int) -> bool:
     db_project = get_project(db, project_id)
     if not db_project:
         return False
+    route_to_project(db, project_id, create=True)
     db.delete(db_project)
     db.commit()
     return True
@@ -57,6 +64,8 @@ def create_task(db: Session, task: schemas.TaskCreate) -> models.Task:
     if project and task.status not in project.statuses:
         raise ValueError(f"Invalid status '{task.status}'. Must be one of: {', '.join(project.statuses)}")
 
+    route_to_project(db, task.project_id, create=True)
+
     # Get max sort_order for siblings
     if task.parent_task_id:
         max_order = db.query(models.Task).filter(
@@ -80,21 +89,109 @@ def create_task(db: Session, task: schemas.TaskCreate) -> models.Task:
 
 
 def get_task(db: Session, task_id: int) -> Optional[models.Task]:
+    if not route_to_task(db, task_id):
+        return None
     return db.query(models.Task).filter(models.Task.id == task_id).first()
 
 
 def get_tasks_by_project(db: Session, project_id: int) -> List[models.Task]:
+    if not route_to_project(db, project_id):
+        return []
     return db.query(models.Task).filter(models.Task.project_id == project_id).all()
 
 
 def get_root_tasks(db: Session, project_id: int) -> List[models.Task]:
     """Get all root-level tasks (no parent) for a project"""
+    if not route_to_project(db, project_id):
+        return []
     return db.query(models.Task).filter(
         models.Task.project_id == project_id,
         models.Task.parent_task_id.is_(None)
     ).order_by(models.Task.sort_order).all()
 
 
+def get_task_tree_index(
+    db: Session,
+    project_id: int,
+    archived_tasks: Iterable[models.Task] = (),
+    root_id: Optional[int] = None
+) -> Tuple[Dict[Optional[int], List[int]], Dict[int, int], Dict[int, int]]:
+    """
+    Build the shape of a project's task tree without loading full task rows.
+
+    Returns a map of parent id (None for roots) to ordered child ids, a map of
+    task id to its total number of descendants, and a map of task id to the
+    summed estimate of its unfinished leaves. Archived tasks passed in are
+    merged into the tree.
+
+    With root_id only that task's subtree is read, so expanding a node costs
+    O(subtree) instead of O(project).
+    """
+    if not route_to_project(db, project_id):
+        return {}, {}, {}
+
+    columns = [
+        models.Task.id, models.Task.parent_task_id, models.Task.sort_order,
+        models.Task.status, models.Task.estimated_minutes
+    ]
+    if root_id is None:
+        rows = db.query(*columns).filter(models.Task.project_id == project_id).all()
+    else:
+        subtree = select(*columns).where(models.Task.id == root_id).cte(recursive=True)
+        subtree = subtree.union_all(
+            select(*columns).where(models.Task.parent_task_id == subtree.c.id)
+        )
+        rows = db.execute(
+            select(subtree), bind_arguments={"mapper": models.Task}
+        ).all()
+    rows += [
+        (task.id, task.parent_task_id, task.sort_order, task.status, task.estimated_minutes)
+        for task in archived_tasks
+    ]
+
+    children: Dict[Optional[int], List[int]] = {}
+    leaf_estimates: Dict[int, int] = {}
+    for task_id, parent_id, sort_order, status, estimated_minutes in sorted(
+        rows, key=lambda r: (r[2] or 0, r[0])
+    ):
+        children.setdefault(parent_id, []).append(task_id)
+        leaf_estimates[task_id] = (estimated_minutes or 0) if status != "done" else 0
+
+    # Walk top-down once, then accumulate counts bottom-up
+    order: List[int] = []
+    stack = list(children.get(root_id, []))
+    while stack:
+        task_id = stack.pop()
+        order.append(task_id)
+        stack.extend(children.get(task_id, []))
+
+    descendants: Dict[int, int] = {}
+    leaf_minutes: Dict[int, int] = {}
+    for task_id in reversed(order):
+        child_ids = children.get(task_id, [])
+        descendants[task_id] = sum(descendants[child_id] + 1 for child_id in child_ids)
+        leaf_minutes[task_id] = (
+            sum(leaf_minutes[child_id] for child_id in child_ids)
+            if child_ids else leaf_estimates[task_id]
+        )
+
+    return children, descendants, leaf_minutes
+
+
+def get_tasks_by_ids(
+    db: Session, project_id: int, task_ids: Iterable[int]
+) -> List[models.Task]:
+    """Load a project's tasks by id, chunked to stay under SQLite's bound parameter limit"""
+    if not route_to_project(db, project_id):
+        return []
+    task_ids = list(task_ids)
+    tasks = []
+    for start in range(0, len(task_ids), 500):
+        chunk = task_ids[start:start + 500]
+        tasks.extend(db.query(models.Task).filter(models.Task.id.in_(chunk)).all())
+    return tasks
+
+
 def get_task_with_subtasks(db: Session, task_id: int) -> Optional[models.Task]:
     """Recursively load a task with all its subtasks"""
     return db.query(models.Task).options(
@@ -137,6 +234,13 @@ def update_task(
 
     update_data = task.model_dump(exclude_unset=True)
 
+    # Parents must be in the same project (and shard); check before routing back
+    if update_data.get("parent_task_id"):
+        parent = get_task(db, update_data["parent_task_id"])
+        if not parent or parent.project_id != db_task.project_id:
+            raise ValueError("Parent task must belong to the same project")
+        route_to_project(db, db_task.project_id)
+
     # Validate status against project's statuses if status is being updated
     if "status" in update_data:
         project = get_project(db, db_task.project_id)
@@ -176,7 +280,464 @@ def get_tasks_by_status(db: Session, project_id: int, status: str) -> List[model
     if project and status not in project.statuses:
         raise ValueError(f"Invalid status '{status}'. Must be one of: {', '.join(project.statuses)}")
 
+    if not route_to_project(db, project_id):
+        return []
     return db.query(models.Task).filter(
         models.Task.project_id == project_id,
         models.Task.status == status
     ).all()
+
+
+def _search_tasks_query(db: Session, query: str):
+    search_term = f"%{query}%"
+    return db.query(models.Task).filter(
+        (models.Task.title.ilike(search_term)) |
+        (models.Task.description.ilike(search_term)) |
+        (models.Task.tags.contains([query]))  # Exact tag match
+    )
+
+
+def _search_archived_tasks(
+    db: Session, query: str, project_ids: Optional[List[int]] = None
+) -> List[models.Task]:
+    """Same matching as _search_tasks_query, applied to archived task rows"""
+    archives_query = db.query(models.TaskArchive)
+    if project_ids:
+        archives_query = archives_query.filter(models.TaskArchive.project_id.in_(project_ids))
+
+    needle = query.lower()
+    return [
+        _archived_row_to_task(row)
+        for archive in archives_query
+        for row in archive.tasks
+        if needle in (row.get("title") or "").lower()
+        or needle in (row.get("description") or "").lower()
+        or query in (row.get("tags") or [])
+    ]
+
+
+def _search_shard(project_id: int, query: str, include_archived: bool) -> List[models.Task]:
+    """Search one project's shard on its own session (runs in a worker thread)"""
+    db = SessionLocal()
+    try:
+        if not route_to_project(db, project_id):
+            return []
+        tasks = _search_tasks_query(db, query).all()
+        if include_archived:
+            tasks += _search_archived_tasks(db, query, [project_id])
+        db.expunge_all()
+        return tasks
+    finally:
+        db.close()
+
+
+def search_tasks(
+    db: Session,
+    query: str,
+    project_ids: Optional[List[int]] = None,
+    include_archived: bool = False
+) -> List[models.Task]:
+    """Search tasks by title, description and tags, optionally limited to some projects"""
+    if not is_sharded():
+        tasks_query = _search_tasks_query(db, query)
+        if project_ids:
+            tasks_query = tasks_query.filter(models.Task.project_id.in_(project_ids))
+        tasks = tasks_query.all()
+        if include_archived:
+            tasks += _search_archived_tasks(db, query, project_ids)
+        return tasks
+
+    # Fan out across project shards in parallel and merge in project order
+    if not project_ids:
+        project_ids = [row[0] for row in db.query(models.Project.id).order_by(models.Project.id)]
+    if not project_ids:
+        return []
+    with ThreadPoolExecutor(max_workers=min(8, len(project_ids))) as executor:
+        results = executor.map(
+            lambda project_id: _search_shard(project_id, query, include_archived), project_ids
+        )
+        return [task for tasks in results for task in tasks]
+
+
+# Task Archive
+def _task_to_archived_row(task: models.Task) -> dict:
+    row = {}
+    for column in models.Task.__table__.columns:
+        value = getattr(task, column.key)
+        row[column.key] = value.isoformat() if isinstance(value, datetime) else value
+    return row
+
+
+def _archived_row_to_task(row: dict, archived: bool = True) -> models.Task:
+    """Rebuild a (transient) Task from an archived row"""
+    data = dict(row)
+    for key in ("created_at", "updated_at"):
+        if data.get(key):
+            data[key] = datetime.fromisoformat(data[key])
+    task = models.Task(**data)
+    task.archived = archived
+    return task
+
+
+def _subtree_ids(children: Dict[Optional[int], List[int]], root_id: int) -> List[int]:
+    """Ids of root_id and all its descendants, parents before children"""
+    ids = []
+    stack = [root_id]
+    while stack:
+        task_id = stack.pop()
+        ids.append(task_id)
+        stack.extend(reversed(children.get(task_id, [])))
+    return ids
+
+
+def _archive_subtree(
+    db: Session, root: models.Task, subtree: List[models.Task]
+) -> models.TaskArchive:
+    """Move a loaded subtree (root first) into a single archive row"""
+    db_archive = models.TaskArchive(
+        project_id=root.project_id,
+        root_task_id=root.id,
+        parent_task_id=root.parent_task_id,
+        sort_order=root.sort_order,
+        title=root.title,
+        task_count=len(subtree),
+        tasks=[_task_to_archived_row(task) for task in subtree]
+    )
+    db.add(db_archive)
+
+    task_ids = [task.id for task in subtree]
+    for start in range(0, len(task_ids), 500):
+        db.query(models.Task).filter(
+            models.Task.id.in_(task_ids[start:start + 500])
+        ).delete(synchronize_session=False)
+    for task in subtree:
+        db.expunge(task)
+    return db_archive
+
+
+def archive_task(db: Session, task_id: int) -> Optional[models.TaskArchive]:
+    """Archive a task and all its subtasks; every task in the subtree must be done"""
+    db_task = get_task(db, task_id)
+    if not db_task:
+        return None
+
+    children = get_task_tree_index(db, db_task.project_id, root_id=task_id)[0]
+    subtree_ids = _subtree_ids(children, task_id)
+    tasks_by_id = {
+        task.id: task for task in get_tasks_by_ids(db, db_task.project_id, subtree_ids)
+    }
+    not_done = [task_id for task_id in subtree_ids if tasks_by_id[task_id].status != "done"]
+    if not_done:
+        raise ValueError(
+            f"Cannot archive: {len(not_done)} task(s) in this subtree are not done"
+        )
+
+    db_archive = _archive_subtree(db, db_task, [tasks_by_id[task_id] for task_id in subtree_ids])
+    db.commit()
+    db.refresh(db_archive)
+    return db_archive
+
+
+def archive_project(db: Session, project_id: int) -> List[models.TaskArchive]:
+    """Archive every fully completed subtree of a project (the whole tree if all done)"""
+    children = get_task_tree_index(db, project_id)[0]
+    if not children:
+        return []
+    statuses = dict(
+        db.query(models.Task.id, models.Task.status)
+        .filter(models.Task.project_id == project_id)
+        .all()
+    )
+
+    # A subtree is complete if its root and all its descendants are done
+    complete: Dict[int, bool] = {}
+    for task_id in reversed(_subtree_ids(children, None)[1:]):
+        complete[task_id] = statuses[task_id] == "done" and all(
+            complete[child_id] for child_id in children.get(task_id, [])
+        )
+
+    # Archive the top-most complete subtrees only
+    archive_roots = []
+    stack = list(children.get(None, []))
+    while stack:
+        task_id = stack.pop()
+        if complete[task_id]:
+            archive_roots.append(task_id)
+        else:
+            stack.extend(children.get(task_id, []))
+
+    archived_ids = [
+        task_id for root_id in archive_roots for task_id in _subtree_ids(children, root_id)
+    ]
+    tasks_by_id = {task.id: task for task in get_tasks_by_ids(db, project_id, archived_ids)}
+
+    db_archives = [
+        _archive_subtree(
+            db,
+            tasks_by_id[root_id],
+            [tasks_by_id[task_id] for task_id in _subtree_ids(children, root_id)]
+        )
+        for root_id in archive_roots
+    ]
+    db.commit()
+    for db_archive in db_archives:
+        db.refresh(db_archive)
+    return db_archives
+
+
+def get_archive(db: Session, archive_id: int) -> Optional[models.TaskArchive]:
+    if not route_to_task(db, archive_id):
+        return None
+    return db.query(models.TaskArchive).filter(models.TaskArchive.id == archive_id).first()
+
+
+def get_archives_by_project(db: Session, project_id: int) -> List[models.TaskArchive]:
+    if not route_to_project(db, project_id):
+        return []
+    return db.query(models.TaskArchive).filter(
+        models.TaskArchive.project_id == project_id
+    ).order_by(models.TaskArchive.archived_at).all()
+
+
+def get_archived_tasks(db: Session, project_id: int) -> List[models.Task]:
+    """Archived tasks of a project as transient (not persisted) Task objects"""
+    return [
+        _archived_row_to_task(row)
+        for archive in get_archives_by_project(db, project_id)
+        for row in archive.tasks
+    ]
+
+
+def restore_archive(db: Session, archive_id: int) -> Optional[models.Task]:
+    """Move an archived subtree back into the tasks table with its original ids and order"""
+    db_archive = get_archive(db, archive_id)
+    if not db_archive:
+        return None
+
+    if db_archive.parent_task_id and not get_task(db, db_archive.parent_task_id):
+        raise ValueError(
+            f"Parent task {db_archive.parent_task_id} no longer exists or is archived; restore it first"
+        )
+
+    task_ids = [row["id"] for row in db_archive.tasks]
+    if get_tasks_by_ids(db, db_archive.project_id, task_ids):
+        raise ValueError("Cannot restore: some archived task ids are already in use")
+
+    tasks = [_archived_row_to_task(row, archived=False) for row in db_archive.tasks]
+    db.add_all(tasks)
+    db.delete(db_archive)
+    db.commit()
+
+    root = tasks[0]
+    db.refresh(root)
+    return root
+
+
+# Merge Import
+# Fields only compared/updated when the incoming node sets them explicitly, so a
+# regenerated plan does not reset progress (e.g. status) it does not mention
+_MERGE_FIELDS = ("description", "status", "estimated_minutes", "tags", "flag_color", "external_key")
+
+
+class _PendingTask:
+    """An incoming node that will be inserted"""
+
+    def __init__(self, node: schemas.ImportSubtask, parent: "_MergeParent", sort_order: int):
+        self.node = node
+        self.parent = parent
+        self.sort_order = sort_order
+        self.db_task: Optional[models.Task] = None
+
+
+_MergeParent = Union[int, None, _PendingTask]
+
+
+def merge_import_tasks(
+    db: Session,
+    project_id: int,
+    tasks: List[schemas.ImportSubtask],
+    delete_missing: bool = True,
+    dry_run: bool = False
+) -> schemas.MergeImportResult:
+    """
+    Merge an imported task tree into an existing project.
+
+    Incoming nodes match existing tasks by external_key anywhere in the project,
+    otherwise by title under the same (matched) parent. Archived tasks match too;
+    they are reported as archived and neither they nor the incoming subtasks below
+    them are touched. The diff is computed in memory from one query plus the
+    project's archives; unless dry_run, only the inserts, updates, moves and
+    deletes are applied, in a single commit.
+    """
+    route_to_project(db, project_id, create=True)
+    columns = [
+        models.Task.id, models.Task.parent_task_id, models.Task.sort_order, models.Task.title
+    ] + [getattr(models.Task, field) for field in _MERGE_FIELDS]
+    rows = db.query(*columns).filter(models.Task.project_id == project_id).all()
+
+    existing = {row.id: row for row in rows}
+    children: Dict[Optional[int], List] = {}
+    for row in sorted(rows, key=lambda r: (r.sort_order or 0, r.id)):
+        children.setdefault(row.parent_task_id, []).append(row)
+
+    # Archived subtrees hang off live tasks (or the project root) by their root
+    archives = get_archives_by_project(db, project_id)
+    archived = {
+        row["id"]: _archived_row_to_task(row) for archive in archives for row in archive.tasks
+    }
+    archived_children: Dict[Optional[int], List] = {}
+    for archive in archives:
+        archived_children.setdefault(archive.parent_task_id, []).append(
+            archived[archive.root_task_id]
+        )
+
+    # Pass 1: external keys match anywhere in the project, live tasks first
+    by_key = {task.external_key: task.id for task in archived.values() if task.external_key}
+    by_key.update((row.external_key, row.id) for row in rows if row.external_key)
+    key_matches: Dict[int, int] = {}
+    claimed = set()
+    stack = list(tasks)
+    while stack:
+        node = stack.pop()
+        task_id = by_key.get(node.external_key) if node.external_key else None
+        if task_id is not None and task_id not in claimed:
+            key_matches[id(node)] = task_id
+            claimed.add(task_id)
+        stack.extend(node.subtasks)
+
+    result = schemas.MergeImportResult(project_id=project_id, dry_run=dry_run)
+    pending: List[_PendingTask] = []
+    task_updates: Dict[int, dict] = {}
+    pending_moves: List[Tuple[int, _PendingTask]] = []
+
+    def take_candidate(candidates: Dict[str, Deque], title: str) -> Optional[int]:
+        """Pop the first unclaimed row; rows sit in both deques, so skip claimed ones"""
+        rows = candidates.get(title)
+        while rows:
+            row = rows.popleft()
+            if row.id not in claimed:
+                claimed.add(row.id)
+                return row.id
+        return None
+
+    # Pass 2: walk the incoming tree, matching remaining nodes by title among siblings.
+    # Keyed nodes were not found by key, so they may only take sibling rows without a key.
+    def walk(nodes: List[schemas.ImportSubtask], parent: _MergeParent, parent_path: str):
+        by_title: Dict[str, Deque] = {}
+        unkeyed_by_title: Dict[str, Deque] = {}
+        if not isinstance(parent, _PendingTask):
+            for row in children.get(parent, []) + archived_children.get(parent, []):
+                if row.id in claimed:
+                    continue
+                by_title.setdefault(row.title, deque()).append(row)
+                if not row.external_key:
+                    unkeyed_by_title.setdefault(row.title, deque()).append(row)
+
+        for idx, node in enumerate(nodes):
+            path = f"{parent_path} / {node.title}" if parent_path else node.title
+
+            task_id = key_matches.get(id(node))
+            if task_id is None:
+                task_id = take_candidate(
+                    unkeyed_by_title if node.external_key else by_title, node.title
+                )
+
+            if task_id is None:
+                pending_task = _PendingTask(node, parent, idx)
+                pending.append(pending_task)
+                result.inserts.append(schemas.MergeInsert(path=path, title=node.title))
+                walk(node.subtasks, pending_task, path)
+                continue
+
+            if task_id in archived:
+                result.archived.append(schemas.MergeArchived(task_id=task_id, path=path))
+                continue
+
+            row = existing[task_id]
+            changes = {}
+            if row.title != node.title:
+                changes["title"] = node.title
+            for field in _MERGE_FIELDS:
+                if field in node.model_fields_set and getattr(row, field) != getattr(node, field):
+                    changes[field] = getattr(node, field)
+            if row.sort_order != idx:
+                changes["sort_order"] = idx
+            if changes:
+                result.updates.append(schemas.MergeUpdate(task_id=task_id, path=path, changes=changes))
+                task_updates[task_id] = dict(changes)
+
+            moved = isinstance(parent, _PendingTask) or row.parent_task_id != parent
+            if moved:
+                result.moves.append(schemas.MergeMove(
+                    task_id=task_id,
+                    path=path,
+                    from_parent_task_id=row.parent_task_id,
+                    to_parent_path=parent_path
+                ))
+                if isinstance(parent, _PendingTask):
+                    pending_moves.append((task_id, parent))
+                else:
+                    task_updates.setdefault(task_id, {})["parent_task_id"] = parent
+
+            if not changes and not moved:
+                result.unchanged += 1
+            walk(node.subtasks, task_id, path)
+
+    walk(tasks, None, "")
+
+    if delete_missing:
+        # Keep missing tasks an archive restores under (and their missing ancestors),
+        # otherwise the archive could never be restored
+        keep = set()
+        for archive in archives:
+            task_id = archive.parent_task_id
+            while task_id in existing and task_id not in claimed and task_id not in keep:
+                keep.add(task_id)
+                task_id = existing[task_id].parent_task_id
+        for row in rows:
+            if row.id in keep:
+                result.kept.append(schemas.MergeDelete(task_id=row.id, title=row.title))
+            elif row.id not in claimed:
+                result.deletes.append(schemas.MergeDelete(task_id=row.id, title=row.title))
+
+    if dry_run:
+        return result
+
+    # Inserts: parents come before children in pending, so the flush assigns their ids first
+    for pending_task in pending:
+        node = pending_task.node
+        db_task = models.Task(
+            project_id=project_id,
+            title=node.title,
+            description=node.description,
+            status=node.status,
+            estimated_minutes=node.estimated_minutes,
+            tags=node.tags,
+            flag_color=node.flag_color,
+            external_key=node.external_key,
+            sort_order=pending_task.sort_order
+        )
+        if isinstance(pending_task.parent, _PendingTask):
+            db_task.parent = pending_task.parent.db_task
+        else:
+            db_task.parent_task_id = pending_task.parent
+        pending_task.db_task = db_task
+    db.add_all([pending_task.db_task for pending_task in pending])
+    db.flush()
+
+    for task_id, parent in pending_moves:
+        task_updates.setdefault(task_id, {})["parent_task_id"] = parent.db_task.id
+    if task_updates:
+        db.execute(
+            update(models.Task),
+            [{"id": task_id, **changes} for task_id, changes in task_updates.items()]
+        )
+
+    delete_ids = [delete.task_id for delete in result.deletes]
+    for start in range(0, len(delete_ids), 500):
+        db.query(models.Task).filter(
+            models.Task.id.in_(delete_ids[start:start + 500])
+        ).delete(synchronize_session=False)
+
+    db.commit()
+    return result
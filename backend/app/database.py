@@ -1,18 +1,141 @@
-from sqlalchemy import create_engine
+import os
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from .settings import settings
 
 SQLALCHEMY_DATABASE_URL = settings.database_url
 
+# In sharded mode each project's shard hands out ids starting at
+# project_id * SHARD_ID_STRIDE, so any task id maps back to its shard
+SHARD_ID_STRIDE = 1_000_000_000
+
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 
+def is_sharded() -> bool:
+    return settings.storage_mode == "sharded"
+
+
+def sharded_tables():
+    """Tables stored per project; models opt in with __shard_by_project__ = True"""
+    return [
+        mapper.local_table for mapper in Base.registry.mappers
+        if getattr(mapper.class_, "__shard_by_project__", False)
+    ]
+
+
+def _create_all(bind: Engine, tables) -> None:
+    """
+    create_all, plus indexes added to the models after a table was created
+    (create_all skips existing tables entirely). Indexes on columns that a
+    pending migration has not added yet are left for later.
+    """
+    Base.metadata.create_all(bind=bind, tables=tables)
+    inspector = inspect(bind)
+    for table in tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            if all(column.name in columns for column in index.columns):
+                index.create(bind=bind, checkfirst=True)
+
+
+def create_tables():
+    """Create the tables that live in the main (catalog) database"""
+    tables = Base.metadata.sorted_tables
+    if is_sharded():
+        sharded = set(sharded_tables())
+        tables = [table for table in tables if table not in sharded]
+    _create_all(engine, tables)
+
+
+_shard_engines: Dict[int, Engine] = {}
+_shard_lock = threading.Lock()
+
+
+def get_shard_engine(project_id: int, create: bool = True) -> Optional[Engine]:
+    """Get the engine for a project's shard, creating the shard file if needed"""
+    with _shard_lock:
+        shard_engine = _shard_engines.get(project_id)
+        if shard_engine:
+            return shard_engine
+
+        path = os.path.join(settings.shard_directory, f"project_{project_id}.db")
+        exists = os.path.exists(path)
+        if not exists and not create:
+            return None
+
+        os.makedirs(settings.shard_directory, exist_ok=True)
+        shard_engine = create_engine(
+            f"sqlite:///{path}", connect_args={"check_same_thread": False}
+        )
+
+        # Also upgrades shards created before a sharded table was added
+        tables = sharded_tables()
+        _create_all(shard_engine, tables)
+        with shard_engine.begin() as conn:
+            for table in tables:
+                conn.execute(
+                    text(
+                        "INSERT INTO sqlite_sequence (name, seq) SELECT :name, :seq "
+                        "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"
+                    ),
+                    {"name": table.name, "seq": project_id * SHARD_ID_STRIDE}
+                )
+
+        _shard_engines[project_id] = shard_engine
+        return shard_engine
+
+
+class RoutingSession(Session):
+    """
+    Session that sends sharded tables to the current project's shard.
+    In single storage mode it behaves like a plain Session.
+    """
+
+    project_id: Optional[int] = None
+
+    def get_bind(self, mapper=None, **kw):
+        if (
+            is_sharded()
+            and mapper is not None
+            and getattr(getattr(mapper, "class_", mapper), "__shard_by_project__", False)
+        ):
+            if self.project_id is None:
+                raise RuntimeError("Sharded query was not routed to a project")
+            return get_shard_engine(self.project_id)
+        return super().get_bind(mapper, **kw)
+
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
+
+
+def route_to_project(db: Session, project_id: int, create: bool = False) -> bool:
+    """
+    Point db's sharded queries at project_id's shard.
+    Returns False if the shard does not exist (and create is False).
+    """
+    if not is_sharded():
+        return True
+    if get_shard_engine(project_id, create=create) is None:
+        return False
+    db.project_id = project_id
+    return True
+
+
+def route_to_task(db: Session, task_id: int) -> bool:
+    """Point db's sharded queries at the shard holding task_id (archive ids work too)"""
+    return route_to_project(db, task_id // SHARD_ID_STRIDE) if is_sharded() else True
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -1,20 +1,34 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
 from typing import List, Optional
 import json
 
 from . import models, schemas, crud
-from .database import engine, get_db
+from .database import create_tables, get_db
 from .settings import settings
+from .write_queue import WriteQueueError, write_queue, run_write
 
 # Create database tables
-models.Base.metadata.create_all(bind=engine)
+create_tables()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if write_queue:
+        write_queue.start()
+    yield
+    if write_queue:
+        write_queue.stop()
+
 
 app = FastAPI(
     title=settings.api_title,
     description=settings.api_description,
-    version=settings.api_version
+    version=settings.api_version,
+    lifespan=lifespan
 )
 
 # CORS middleware for frontend
@@ -27,6 +41,12 @@ app.add_middleware(
 )
 
 
+@app.exception_handler(WriteQueueError)
+def write_queue_error_handler(request: Request, exc: WriteQueueError):
+    """The writer is down or backed up: tell the client to retry instead of hanging"""
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+
 # ========== PROJECT ENDPOINTS ==========
 
 @app.get("/api/projects", response_model=List[schemas.Project])
@@ -38,7 +58,7 @@ def list_projects(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
 @app.post("/api/projects", response_model=schemas.Project, status_code=201)
 def create_project(project: schemas.ProjectCreate, db: Session = Depends(get_db)):
     """Create a new project"""
-    return crud.create_project(db, project)
+    return run_write(db, crud.create_project, project)
 
 
 @app.get("/api/projects/{project_id}", response_model=schemas.Project)
@@ -55,7 +75,7 @@ def update_project(
     project_id: int, project: schemas.ProjectUpdate, db: Session = Depends(get_db)
 ):
     """Update a project"""
-    db_project = crud.update_project(db, project_id, project)
+    db_project = run_write(db, crud.update_project, project_id, project)
     if not db_project:
         raise HTTPException(status_code=404, detail="Project not found")
     return db_project
@@ -64,7 +84,7 @@ def update_project(
 @app.delete("/api/projects/{project_id}", status_code=204)
 def delete_project(project_id: int, db: Session = Depends(get_db)):
     """Delete a project and all its tasks"""
-    if not crud.delete_project(db, project_id):
+    if not run_write(db, crud.delete_project, project_id):
         raise HTTPException(status_code=404, detail="Project not found")
     return None
 
@@ -72,27 +92,105 @@ def delete_project(project_id: int, db: Session = Depends(get_db)):
 # ========== TASK ENDPOINTS ==========
 
 @app.get("/api/projects/{project_id}/tasks", response_model=List[schemas.Task])
-def list_project_tasks(project_id: int, db: Session = Depends(get_db)):
-    """List all tasks for a project"""
+def list_project_tasks(
+    project_id: int,
+    include_archived: bool = False,
+    db: Session = Depends(get_db)
+):
+    """List all tasks for a project (archived tasks only if include_archived)"""
     if not crud.get_project(db, project_id):
         raise HTTPException(status_code=404, detail="Project not found")
-    return crud.get_tasks_by_project(db, project_id)
+    tasks = crud.get_tasks_by_project(db, project_id)
+    if include_archived:
+        tasks += crud.get_archived_tasks(db, project_id)
+    return tasks
+
+
+def _build_task_tree(
+    db: Session,
+    project_id: int,
+    parent_id: Optional[int] = None,
+    depth: Optional[int] = None,
+    include_archived: bool = False
+) -> List[schemas.TaskWithSubtasks]:
+    """
+    Build the subtree below parent_id (project roots when None), at most depth
+    levels deep. Child and descendant counts are always reported so collapsed
+    nodes can be expanded later without loading their subtrees now.
+    """
+    archived_tasks = crud.get_archived_tasks(db, project_id) if include_archived else []
+    children, descendants, leaf_minutes = crud.get_task_tree_index(
+        db, project_id, archived_tasks, root_id=parent_id
+    )
+
+    # Only load the rows that will actually be returned
+    visible = []
+    level = children.get(parent_id, [])
+    remaining = depth
+    while level and (remaining is None or remaining > 0):
+        visible.extend(level)
+        level = [child_id for task_id in level for child_id in children.get(task_id, [])]
+        remaining = None if remaining is None else remaining - 1
+    tasks = crud.get_tasks_by_ids(db, project_id, visible)
+
+    tasks_by_id = {task.id: task for task in archived_tasks}
+    tasks_by_id.update((task.id, task) for task in tasks)
+
+    def build_node(task_id: int, remaining: Optional[int]) -> schemas.TaskWithSubtasks:
+        child_ids = children.get(task_id, [])
+        expand = remaining is None or remaining > 1
+        next_remaining = None if remaining is None else remaining - 1
+        return schemas.TaskWithSubtasks(
+            **schemas.Task.model_validate(tasks_by_id[task_id]).model_dump(),
+            subtasks=[build_node(child_id, next_remaining) for child_id in child_ids] if expand else [],
+            child_count=len(child_ids),
+            descendant_count=descendants.get(task_id, 0),
+            leaf_minutes=leaf_minutes.get(task_id, 0),
+            has_more=bool(child_ids) and not expand
+        )
+
+    return [build_node(task_id, depth) for task_id in children.get(parent_id, [])]
 
 
 @app.get("/api/projects/{project_id}/tasks/tree", response_model=List[schemas.TaskWithSubtasks])
-def get_project_task_tree(project_id: int, db: Session = Depends(get_db)):
-    """Get the task tree (root tasks with nested subtasks) for a project"""
+def get_project_task_tree(
+    project_id: int,
+    depth: Optional[int] = Query(None, ge=1),
+    root_id: Optional[int] = None,
+    include_archived: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Get the task tree (root tasks with nested subtasks) for a project.
+
+    Args:
+        depth: Number of levels to return (optional, returns the full tree if not provided)
+        root_id: Return the subtree below this task instead of the project roots (optional)
+        include_archived: Also return archived subtrees (optional)
+    """
     if not crud.get_project(db, project_id):
         raise HTTPException(status_code=404, detail="Project not found")
 
-    root_tasks = crud.get_root_tasks(db, project_id)
+    if root_id is not None:
+        root_task = crud.get_task(db, root_id)
+        if not root_task or root_task.project_id != project_id:
+            raise HTTPException(status_code=404, detail="Task not found")
 
-    def build_tree(task):
-        task_dict = schemas.TaskWithSubtasks.model_validate(task)
-        task_dict.subtasks = [build_tree(subtask) for subtask in task.subtasks]
-        return task_dict
+    return _build_task_tree(db, project_id, root_id, depth, include_archived)
 
-    return [build_tree(task) for task in root_tasks]
+
+@app.get("/api/tasks/{task_id}/children", response_model=List[schemas.TaskWithSubtasks])
+def get_task_children(
+    task_id: int,
+    depth: int = Query(1, ge=1),
+    include_archived: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Expand a task: get its subtree, one level deep by default"""
+    db_task = crud.get_task(db, task_id)
+    if not db_task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return _build_task_tree(db, db_task.project_id, task_id, depth, include_archived)
 
 
 @app.get("/api/projects/{project_id}/tasks/by-status/{status}", response_model=List[schemas.Task])
@@ -116,11 +214,15 @@ def create_task(task: schemas.TaskCreate, db: Session = Depends(get_db)):
     if not crud.get_project(db, task.project_id):
         raise HTTPException(status_code=404, detail="Project not found")
 
-    if task.parent_task_id and not crud.get_task(db, task.parent_task_id):
-        raise HTTPException(status_code=404, detail="Parent task not found")
+    if task.parent_task_id:
+        parent_task = crud.get_task(db, task.parent_task_id)
+        if not parent_task:
+            raise HTTPException(status_code=404, detail="Parent task not found")
+        if parent_task.project_id != task.project_id:
+            raise HTTPException(status_code=400, detail="Parent task belongs to a different project")
 
     try:
-        return crud.create_task(db, task)
+        return run_write(db, crud.create_task, task)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -137,8 +239,18 @@ def get_task(task_id: int, db: Session = Depends(get_db)):
 @app.put("/api/tasks/{task_id}", response_model=schemas.Task)
 def update_task(task_id: int, task: schemas.TaskUpdate, db: Session = Depends(get_db)):
     """Update a task"""
+    if task.parent_task_id:
+        db_task = crud.get_task(db, task_id)
+        if not db_task:
+            raise HTTPException(status_code=404, detail="Task not found")
+        parent_task = crud.get_task(db, task.parent_task_id)
+        if not parent_task:
+            raise HTTPException(status_code=404, detail="Parent task not found")
+        if parent_task.project_id != db_task.project_id:
+            raise HTTPException(status_code=400, detail="Parent task belongs to a different project")
+
     try:
-        db_task = crud.update_task(db, task_id, task)
+        db_task = run_write(db, crud.update_task, task_id, task)
         if not db_task:
             raise HTTPException(status_code=404, detail="Task not found")
         return db_task
@@ -149,7 +261,7 @@ def update_task(task_id: int, task: schemas.TaskUpdate, db: Session = Depends(ge
 @app.delete("/api/tasks/{task_id}", status_code=204)
 def delete_task(task_id: int, db: Session = Depends(get_db)):
     """Delete a task and all its subtasks"""
-    if not crud.delete_task(db, task_id):
+    if not run_write(db, crud.delete_task, task_id):
         raise HTTPException(status_code=404, detail="Task not found")
     return None
 
@@ -160,6 +272,7 @@ def delete_task(task_id: int, db: Session = Depends(get_db)):
 def search_tasks(
     query: str,
     project_ids: Optional[str] = None,
+    include_archived: bool = False,
     db: Session = Depends(get_db)
 ):
     """
@@ -168,6 +281,7 @@ def search_tasks(
     Args:
         query: Search term to match against title, description, and tags
         project_ids: Comma-separated list of project IDs to search in (optional, searches all if not provided)
+        include_archived: Also search archived tasks (optional)
     """
     # Parse project IDs if provided
     project_id_list = None
@@ -177,22 +291,49 @@ def search_tasks(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid project_ids format")
 
-    # Build query
-    tasks_query = db.query(models.Task)
+    return crud.search_tasks(db, query, project_id_list, include_archived)
 
-    # Filter by project IDs if specified
-    if project_id_list:
-        tasks_query = tasks_query.filter(models.Task.project_id.in_(project_id_list))
 
-    # Search in title, description, and tags
-    search_term = f"%{query}%"
-    tasks = tasks_query.filter(
-        (models.Task.title.ilike(search_term)) |
-        (models.Task.description.ilike(search_term)) |
-        (models.Task.tags.contains([query]))  # Exact tag match
-    ).all()
+# ========== ARCHIVE ENDPOINTS ==========
 
-    return tasks
+@app.post("/api/tasks/{task_id}/archive", response_model=schemas.TaskArchive, status_code=201)
+def archive_task(task_id: int, db: Session = Depends(get_db)):
+    """Archive a fully completed task and all its subtasks"""
+    try:
+        db_archive = run_write(db, crud.archive_task, task_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not db_archive:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return db_archive
+
+
+@app.post("/api/projects/{project_id}/archive", response_model=List[schemas.TaskArchive])
+def archive_project(project_id: int, db: Session = Depends(get_db)):
+    """Archive every fully completed subtree of a project"""
+    if not crud.get_project(db, project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    return run_write(db, crud.archive_project, project_id)
+
+
+@app.get("/api/projects/{project_id}/archives", response_model=List[schemas.TaskArchive])
+def list_project_archives(project_id: int, db: Session = Depends(get_db)):
+    """List the archived subtrees of a project"""
+    if not crud.get_project(db, project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    return crud.get_archives_by_project(db, project_id)
+
+
+@app.post("/api/archives/{archive_id}/restore", response_model=schemas.Task)
+def restore_archive(archive_id: int, db: Session = Depends(get_db)):
+    """Restore an archived subtree with its original ids and ordering; returns its root task"""
+    try:
+        db_task = run_write(db, crud.restore_archive, archive_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not db_task:
+        raise HTTPException(status_code=404, detail="Archive not found")
+    return db_task
 
 
 # ========== JSON IMPORT ENDPOINT ==========
@@ -236,6 +377,7 @@ def _import_tasks_recursive(
             estimated_minutes=task_data.estimated_minutes,
             tags=task_data.tags,
             flag_color=task_data.flag_color,
+            external_key=task_data.external_key,
             sort_order=idx
         )
         db_task = crud.create_task(db, task)
@@ -249,6 +391,40 @@ def _import_tasks_recursive(
     return count
 
 
+def _import_project(db: Session, import_data: schemas.ImportData) -> schemas.ImportResult:
+    """Create the project and its task tree; runs as a single write"""
+    # Create the project with optional statuses
+    project = crud.create_project(
+        db,
+        schemas.ProjectCreate(
+            name=import_data.project.name,
+            description=import_data.project.description,
+            statuses=import_data.project.statuses
+        )
+    )
+
+    # Validate all task statuses before importing
+    if import_data.tasks:
+        try:
+            _validate_task_statuses_recursive(import_data.tasks, project.statuses)
+        except ValueError as e:
+            # Rollback the project creation if validation fails
+            db.delete(project)
+            db.commit()
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # Recursively import tasks
+    tasks_created = _import_tasks_recursive(
+        db, project.id, import_data.tasks
+    )
+
+    return schemas.ImportResult(
+        project_id=project.id,
+        project_name=project.name,
+        tasks_created=tasks_created
+    )
+
+
 @app.post("/api/import-json", response_model=schemas.ImportResult)
 def import_from_json(import_data: schemas.ImportData, db: Session = Depends(get_db)):
     """
@@ -277,36 +453,45 @@ def import_from_json(import_data: schemas.ImportData, db: Session = Depends(get_
         ]
     }
     """
-    # Create the project with optional statuses
-    project = crud.create_project(
-        db,
-        schemas.ProjectCreate(
-            name=import_data.project.name,
-            description=import_data.project.description,
-            statuses=import_data.project.statuses
-        )
-    )
+    return run_write(db, _import_project, import_data)
 
-    # Validate all task statuses before importing
-    if import_data.tasks:
-        try:
-            _validate_task_statuses_recursive(import_data.tasks, project.statuses)
-        except ValueError as e:
-            # Rollback the project creation if validation fails
-            db.delete(project)
-            db.commit()
-            raise HTTPException(status_code=400, detail=str(e))
 
-    # Recursively import tasks
-    tasks_created = _import_tasks_recursive(
-        db, project.id, import_data.tasks
-    )
+@app.post("/api/projects/{project_id}/import-json/merge", response_model=schemas.MergeImportResult)
+def merge_import_json(
+    project_id: int,
+    merge_data: schemas.MergeImportData,
+    dry_run: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Merge a JSON task tree into an existing project instead of creating a new one.
 
-    return schemas.ImportResult(
-        project_id=project.id,
-        project_name=project.name,
-        tasks_created=tasks_created
-    )
+    Tasks are matched by external_key, otherwise by title under the same parent;
+    matched tasks keep their ids, and fields the import leaves out (e.g. status)
+    keep their current values. Returns the diff; with dry_run nothing is changed.
+    """
+    project = crud.get_project(db, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    try:
+        _validate_task_statuses_recursive(merge_data.tasks, project.statuses)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if dry_run:
+        return crud.merge_import_tasks(db, project_id, merge_data.tasks, merge_data.delete_missing, dry_run=True)
+    return run_write(db, crud.merge_import_tasks, project_id, merge_data.tasks, merge_data.delete_missing)
+
+
+# ========== WRITE QUEUE ENDPOINT ==========
+
+@app.get("/api/write-queue/stats", response_model=schemas.WriteQueueStats)
+def get_write_queue_stats():
+    """Throughput and latency of the group-commit write queue"""
+    if not write_queue:
+        return schemas.WriteQueueStats(enabled=False)
+    return schemas.WriteQueueStats(enabled=True, **write_queue.stats())
 
 
 @app.get("/")
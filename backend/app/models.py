@@ -19,14 +19,17 @@ class Project(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     tasks = relationship("Task", back_populates="project", cascade="all, delete-orphan")
+    archives = relationship("TaskArchive", cascade="all, delete-orphan")
 
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = {"sqlite_autoincrement": True}
+    __shard_by_project__ = True
 
     id = Column(Integer, primary_key=True, index=True)
-    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
-    parent_task_id = Column(Integer, ForeignKey("tasks.id"), nullable=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, index=True)
+    parent_task_id = Column(Integer, ForeignKey("tasks.id"), nullable=True, index=True)
     title = Column(String(500), nullable=False)
     description = Column(Text, nullable=True)
     status = Column(String(50), default="backlog", nullable=False)
@@ -34,8 +37,26 @@ class Task(Base):
     estimated_minutes = Column(Integer, nullable=True)
     tags = Column(JSON, nullable=True)
     flag_color = Column(String(50), nullable=True)
+    external_key = Column(String(255), nullable=True, index=True)  # Stable id from an import source
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     project = relationship("Project", back_populates="tasks")
     parent = relationship("Task", remote_side=[id], backref="subtasks")
+
+
+class TaskArchive(Base):
+    """A fully completed subtree moved out of the tasks table, stored as one row"""
+    __tablename__ = "task_archives"
+    __table_args__ = {"sqlite_autoincrement": True}
+    __shard_by_project__ = True
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    root_task_id = Column(Integer, nullable=False)
+    parent_task_id = Column(Integer, nullable=True)  # Where the subtree is restored to
+    sort_order = Column(Integer, default=0)
+    title = Column(String(500), nullable=False)
+    task_count = Column(Integer, nullable=False)
+    tasks = Column(JSON, nullable=False)  # Task rows of the subtree, parents before children
+    archived_at = Column(DateTime, default=datetime.utcnow)
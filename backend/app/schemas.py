@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from datetime import datetime
 from .models import DEFAULT_STATUSES
 
@@ -14,6 +14,7 @@ class TaskBase(BaseModel):
     estimated_minutes: Optional[int] = None
     tags: Optional[List[str]] = None
     flag_color: Optional[str] = None
+    external_key: Optional[str] = None
 
 
 class TaskCreate(TaskBase):
@@ -29,6 +30,7 @@ class TaskUpdate(BaseModel):
     estimated_minutes: Optional[int] = None
     tags: Optional[List[str]] = None
     flag_color: Optional[str] = None
+    external_key: Optional[str] = None
 
 
 class Task(TaskBase):
@@ -36,12 +38,17 @@ class Task(TaskBase):
     project_id: int
     created_at: datetime
     updated_at: datetime
+    archived: bool = False
 
     model_config = ConfigDict(from_attributes=True)
 
 
 class TaskWithSubtasks(Task):
     subtasks: List['TaskWithSubtasks'] = []
+    child_count: int = 0
+    descendant_count: int = 0
+    leaf_minutes: int = 0  # Summed estimate of unfinished leaves, covers unloaded children
+    has_more: bool = False  # True when children exist but were not included (depth limit)
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -85,6 +92,7 @@ class ImportSubtask(BaseModel):
     estimated_minutes: Optional[int] = None
     tags: Optional[List[str]] = None
     flag_color: Optional[str] = None
+    external_key: Optional[str] = None  # Used to match existing tasks in a merge import
     subtasks: List['ImportSubtask'] = []
 
 
@@ -103,3 +111,78 @@ class ImportResult(BaseModel):
     project_id: int
     project_name: str
     tasks_created: int
+
+
+# Merge Import Schemas
+class MergeImportData(BaseModel):
+    tasks: List[ImportSubtask] = []
+    delete_missing: bool = True  # Delete existing tasks that are not in the import
+
+
+class MergeInsert(BaseModel):
+    path: str
+    title: str
+
+
+class MergeUpdate(BaseModel):
+    task_id: int
+    path: str
+    changes: Dict[str, Any]
+
+
+class MergeMove(BaseModel):
+    task_id: int
+    path: str
+    from_parent_task_id: Optional[int] = None
+    to_parent_path: str  # Empty for the project root
+
+
+class MergeDelete(BaseModel):
+    task_id: int
+    title: str
+
+
+class MergeArchived(BaseModel):
+    task_id: int
+    path: str
+
+
+class MergeImportResult(BaseModel):
+    project_id: int
+    dry_run: bool
+    inserts: List[MergeInsert] = []
+    updates: List[MergeUpdate] = []
+    moves: List[MergeMove] = []
+    deletes: List[MergeDelete] = []
+    archived: List[MergeArchived] = []  # Matched archived tasks, left in their archive
+    kept: List[MergeDelete] = []  # Missing tasks kept because an archive restores under them
+    unchanged: int = 0
+
+
+# Archive Schemas
+class TaskArchive(BaseModel):
+    id: int
+    project_id: int
+    root_task_id: int
+    parent_task_id: Optional[int] = None
+    sort_order: int
+    title: str
+    task_count: int
+    archived_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+# Write Queue Schemas
+class WriteQueueStats(BaseModel):
+    enabled: bool
+    running: bool = False
+    queued: int = 0
+    operations: int = 0
+    errors: int = 0
+    batches: int = 0
+    avg_batch_size: float = 0.0
+    ops_per_second: float = 0.0
+    latency_p50_ms: float = 0.0
+    latency_p95_ms: float = 0.0
+    latency_max_ms: float = 0.0
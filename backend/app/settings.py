@@ -8,6 +8,16 @@ class Settings(BaseSettings):
     # Database Configuration
     database_url: str = "sqlite:///./tesseract.db"
 
+    # Storage Mode: "single" keeps everything in database_url, "sharded" keeps
+    # projects in database_url and each project's tasks in its own SQLite file
+    storage_mode: str = "single"
+    shard_directory: str = "./shards"
+
+    # Write Queue Configuration (single writer with group commit)
+    write_queue_enabled: bool = False
+    write_queue_max_batch: int = 64
+    write_queue_timeout: float = 30.0  # Seconds a request waits for its write
+
     # API Configuration
     api_title: str = "Tesseract - Nested Todo Tree API"
     api_description: str = "API for managing deeply nested todo trees"
@@ -0,0 +1,235 @@
+"""
+Single-writer group-commit queue for SQLite.
+
+SQLite allows one writer at a time, so concurrent request handlers that each
+commit on their own serialize on the write lock and pay a full fsync per
+change. When enabled, request handlers hand their mutations to one writer
+thread instead. The writer applies everything queued since its last commit in
+a single transaction, isolating each mutation in a SAVEPOINT so one failure
+does not affect the others, and hands every caller its own result or error.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import suppress
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, sessionmaker
+
+from .database import RoutingSession, engine
+from .settings import settings
+
+
+class WriteQueueError(RuntimeError):
+    """The write queue is not running or did not apply a write in time"""
+
+
+class GroupCommitSession(RoutingSession):
+    """Session used by the writer: commit() only flushes, the writer commits the batch"""
+
+    def commit(self) -> None:
+        self.flush()
+
+    def commit_batch(self) -> None:
+        super().commit()
+
+
+@event.listens_for(GroupCommitSession, "after_begin")
+def _begin_outer_transaction(session, transaction, connection):
+    """
+    pysqlite only sends BEGIN before DML, never before SAVEPOINT, so without this
+    the first savepoint of a batch would be the outermost transaction and its
+    RELEASE would commit that write on its own. Open the batch transaction
+    explicitly on every connection the writer uses (catalog and shards).
+    """
+    dbapi_connection = connection.connection.dbapi_connection
+    if not dbapi_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN")
+
+
+class _WriteOp:
+    __slots__ = ("fn", "args", "kwargs", "future", "enqueued_at")
+
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+_STOP = object()
+
+
+class WriteQueue:
+    """Applies queued mutations from a single thread in batched transactions"""
+
+    def __init__(self, session_factory: Callable[[], Session], max_batch: int = 64):
+        self._session_factory = session_factory
+        self._max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self) -> None:
+        self._started_at = time.perf_counter()
+        self._ops = 0
+        self._errors = 0
+        self._batches = 0
+        self._latencies: Deque[float] = deque(maxlen=10000)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._reset_stats()
+        self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if not self._thread:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """Queue fn(db, *args, **kwargs) for the writer thread"""
+        if not self._thread or not self._thread.is_alive():
+            raise WriteQueueError("Write queue is not running")
+        op = _WriteOp(fn, args, kwargs)
+        self._queue.put(op)
+        return op.future
+
+    def _run(self) -> None:
+        db = self._session_factory()
+        try:
+            while True:
+                op = self._queue.get()
+                if op is _STOP:
+                    return
+
+                # Group everything that queued up while the last batch committed
+                batch = [op]
+                stopping = False
+                while len(batch) < self._max_batch:
+                    try:
+                        op = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if op is _STOP:
+                        stopping = True
+                        break
+                    batch.append(op)
+
+                try:
+                    self._apply_batch(db, batch)
+                except Exception as e:
+                    # Never leave a caller waiting; start over with a fresh session
+                    self._fail(batch, e)
+                    with suppress(Exception):
+                        db.close()
+                    db = self._session_factory()
+                if stopping:
+                    return
+        finally:
+            db.close()
+            # Writes queued after the writer stopped would otherwise wait forever
+            while True:
+                try:
+                    op = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if op is not _STOP:
+                    self._fail([op], WriteQueueError("Write queue stopped"))
+
+    @staticmethod
+    def _fail(batch: List[_WriteOp], error: Exception) -> None:
+        for op in batch:
+            if not op.future.done():
+                op.future.set_exception(error)
+
+    def _apply_batch(self, db: Session, batch: List[_WriteOp]) -> None:
+        outcomes = []
+        for op in batch:
+            if not op.future.set_running_or_notify_cancel():
+                continue
+            try:
+                with db.begin_nested():
+                    result = op.fn(db, *op.args, **op.kwargs)
+                outcomes.append((op, result, None))
+            except Exception as e:
+                outcomes.append((op, None, e))
+
+        try:
+            db.commit_batch()
+        except Exception as e:
+            db.rollback()
+            outcomes = [(op, None, error or e) for op, _, error in outcomes]
+        # Hand back detached objects; callers serialize them on their own threads
+        db.expunge_all()
+
+        finished_at = time.perf_counter()
+        with self._stats_lock:
+            self._batches += 1
+            for op, _, error in outcomes:
+                self._ops += 1
+                self._errors += error is not None
+                self._latencies.append(finished_at - op.enqueued_at)
+
+        for op, result, error in outcomes:
+            if error is not None:
+                op.future.set_exception(error)
+            else:
+                op.future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Throughput and latency since the queue was started"""
+        with self._stats_lock:
+            elapsed = time.perf_counter() - self._started_at
+            latencies = sorted(self._latencies)
+            ops, errors, batches = self._ops, self._errors, self._batches
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+        return {
+            "running": self._thread is not None,
+            "queued": self._queue.qsize(),
+            "operations": ops,
+            "errors": errors,
+            "batches": batches,
+            "avg_batch_size": ops / batches if batches else 0.0,
+            "ops_per_second": ops / elapsed if elapsed > 0 else 0.0,
+            "latency_p50_ms": percentile(0.50),
+            "latency_p95_ms": percentile(0.95),
+            "latency_max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+
+WriterSessionLocal = sessionmaker(
+    class_=GroupCommitSession, autoflush=False, expire_on_commit=False, bind=engine
+)
+
+# Global write queue, only created when enabled in settings
+write_queue = (
+    WriteQueue(WriterSessionLocal, max_batch=settings.write_queue_max_batch)
+    if settings.write_queue_enabled else None
+)
+
+
+def run_write(db: Session, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run fn(db, ...) through the write queue if enabled, otherwise directly on db"""
+    if write_queue is None:
+        return fn(db, *args, **kwargs)
+    try:
+        return write_queue.submit(fn, *args, **kwargs).result(timeout=settings.write_queue_timeout)
+    except FutureTimeoutError:
+        raise WriteQueueError(
+            f"Write was not applied within {settings.write_queue_timeout:g} seconds"
+        ) from None
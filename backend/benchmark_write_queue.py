@@ -0,0 +1,105 @@
+"""
+Benchmark concurrent task creation with and without the group-commit write queue.
+Runs against a throwaway SQLite file; does not touch tesseract.db.
+
+Usage: python benchmark_write_queue.py [clients] [writes_per_client]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, schemas
+from app.write_queue import GroupCommitSession, WriteQueue
+
+
+def run_clients(clients, writes_per_client, write):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients)
+
+    def client(client_id):
+        barrier.wait()
+        for i in range(writes_per_client):
+            started = time.perf_counter()
+            try:
+                write(f"client {client_id} task {i}")
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, sorted(latencies), errors
+
+
+def report(label, elapsed, latencies, errors):
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+
+    print(f"{label}:")
+    print(f"  writes ok:   {len(latencies)} ({len(errors)} errors)")
+    print(f"  throughput:  {len(latencies) / elapsed:.1f} writes/s")
+    print(f"  latency p50: {percentile(0.50):.1f} ms  p95: {percentile(0.95):.1f} ms  max: {percentile(1.0):.1f} ms")
+    if errors:
+        print(f"  first error: {errors[0]}")
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    writes_per_client = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(
+            f"sqlite:///{os.path.join(tmp, 'benchmark.db')}",
+            connect_args={"check_same_thread": False, "timeout": 5}
+        )
+        models.Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        db = SessionLocal()
+        project_id = crud.create_project(db, schemas.ProjectCreate(name="Benchmark")).id
+        db.close()
+
+        def task(title):
+            return schemas.TaskCreate(project_id=project_id, title=title)
+
+        # Every client commits on its own session
+        def direct_write(title):
+            db = SessionLocal()
+            try:
+                crud.create_task(db, task(title))
+            finally:
+                db.close()
+
+        report(f"Direct commits ({clients} clients x {writes_per_client})",
+               *run_clients(clients, writes_per_client, direct_write))
+
+        # Every client hands its write to the single writer
+        queue = WriteQueue(
+            sessionmaker(class_=GroupCommitSession, autoflush=False,
+                         expire_on_commit=False, bind=engine)
+        )
+        queue.start()
+        report(f"Write queue ({clients} clients x {writes_per_client})",
+               *run_clients(clients, writes_per_client,
+                            lambda title: queue.submit(crud.create_task, task(title)).result()))
+        stats = queue.stats()
+        queue.stop()
+        print(f"  batches:     {stats['batches']} (avg {stats['avg_batch_size']:.1f} writes per commit)")
+
+
+if __name__ == "__main__":
+    main()
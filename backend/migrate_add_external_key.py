@@ -0,0 +1,59 @@
+"""
+Migration script to add external_key column to tasks table
+Run this script once to update existing databases (including project shards)
+"""
+import glob
+import os
+import sqlite3
+
+
+def migrate_database(path):
+    # Connect to the database
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+
+    try:
+        # Skip databases without a tasks table (e.g. a sharded catalog)
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='tasks'")
+        if not cursor.fetchone():
+            print(f"✓ {path}: no tasks table, nothing to do")
+            return
+
+        # Check if external_key column already exists
+        cursor.execute("PRAGMA table_info(tasks)")
+        columns = [column[1] for column in cursor.fetchall()]
+
+        if 'external_key' in columns:
+            print(f"✓ {path}: column 'external_key' already exists in tasks table")
+            return
+
+        print(f"Adding 'external_key' column to tasks table in {path}...")
+        cursor.execute("ALTER TABLE tasks ADD COLUMN external_key VARCHAR(255)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_tasks_external_key ON tasks (external_key)")
+
+        conn.commit()
+        print(f"✓ {path}: successfully added 'external_key' column to tasks table")
+
+    except sqlite3.Error as e:
+        print(f"✗ Error during migration of {path}: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def migrate():
+    paths = ['tesseract.db'] + sorted(glob.glob(os.path.join('shards', '*.db')))
+    for path in paths:
+        if os.path.exists(path):
+            migrate_database(path)
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Database Migration: Add external_key column to tasks")
+    print("=" * 60)
+    migrate()
+    print("=" * 60)
+    print("Migration completed!")
+    print("=" * 60)
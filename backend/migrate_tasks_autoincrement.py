@@ -0,0 +1,105 @@
+"""
+Migration script to rebuild the tasks table with AUTOINCREMENT
+Run this script once on databases created before task ids were AUTOINCREMENT.
+
+Without AUTOINCREMENT SQLite reuses the highest id after that task is deleted or
+archived, so restoring an archived subtree could find its ids taken. The rebuilt
+table's sequence starts past every id in tasks and in task_archives.
+"""
+import glob
+import json
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.dialects import sqlite as sqlite_dialect  # noqa: E402
+from sqlalchemy.schema import CreateIndex, CreateTable  # noqa: E402
+
+from app.models import Task  # noqa: E402
+
+
+def _max_archived_task_id(cursor):
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='task_archives'")
+    if not cursor.fetchone():
+        return 0
+    max_id = 0
+    cursor.execute("SELECT tasks FROM task_archives")
+    for (payload,) in cursor.fetchall():
+        for row in json.loads(payload):
+            max_id = max(max_id, row["id"])
+    return max_id
+
+
+def migrate_database(path):
+    # Connect to the database (manage the transaction ourselves)
+    conn = sqlite3.connect(path, isolation_level=None)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='tasks'")
+        table = cursor.fetchone()
+        if not table:
+            print(f"✓ {path}: no tasks table, nothing to do")
+            return
+        if "AUTOINCREMENT" in table[0].upper():
+            print(f"✓ {path}: tasks table already uses AUTOINCREMENT")
+            return
+
+        cursor.execute("PRAGMA table_info(tasks)")
+        old_columns = {column[1] for column in cursor.fetchall()}
+        columns = [column.name for column in Task.__table__.columns if column.name in old_columns]
+        column_list = ", ".join(columns)
+
+        print(f"Rebuilding tasks table with AUTOINCREMENT in {path}...")
+        cursor.execute("BEGIN")
+
+        # Index names must be free for the new table
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='tasks' AND sql IS NOT NULL"
+        )
+        for (index_name,) in cursor.fetchall():
+            cursor.execute(f'DROP INDEX "{index_name}"')
+
+        cursor.execute("ALTER TABLE tasks RENAME TO tasks_old")
+        dialect = sqlite_dialect.dialect()
+        cursor.execute(str(CreateTable(Task.__table__).compile(dialect=dialect)))
+        for index in Task.__table__.indexes:
+            cursor.execute(str(CreateIndex(index).compile(dialect=dialect)))
+        cursor.execute(f"INSERT INTO tasks ({column_list}) SELECT {column_list} FROM tasks_old")
+        cursor.execute("DROP TABLE tasks_old")
+
+        # Start the sequence past every live and archived task id
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM tasks")
+        seq = max(cursor.fetchone()[0], _max_archived_task_id(cursor))
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'tasks'")
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('tasks', ?)", (seq,))
+
+        cursor.execute("COMMIT")
+        print(f"✓ {path}: tasks table rebuilt, new ids start after {seq}")
+
+    except sqlite3.Error as e:
+        print(f"✗ Error during migration of {path}: {e}")
+        if conn.in_transaction:
+            cursor.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def migrate():
+    paths = ['tesseract.db'] + sorted(glob.glob(os.path.join('shards', '*.db')))
+    for path in paths:
+        if os.path.exists(path):
+            migrate_database(path)
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Database Migration: Rebuild tasks table with AUTOINCREMENT")
+    print("=" * 60)
+    migrate()
+    print("=" * 60)
+    print("Migration completed!")
+    print("=" * 60)
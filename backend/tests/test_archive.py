@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import MetaData, create_engine
+from sqlalchemy.orm import sessionmaker
+
+import migrate_tasks_autoincrement
+from app import crud, models, schemas
+
+
+def create_legacy_tables(path):
+    """tasks as created before AUTOINCREMENT: ids can be reused"""
+    engine = create_engine(f"sqlite:///{path}")
+    metadata = MetaData()
+    models.Project.__table__.to_metadata(metadata)
+    tasks = models.Task.__table__.to_metadata(metadata)
+    tasks.dialect_options["sqlite"]["autoincrement"] = False
+    models.TaskArchive.__table__.to_metadata(metadata)
+    metadata.create_all(bind=engine)
+    return engine
+
+
+def create_tasks(db, titles, status="done"):
+    project = crud.create_project(db, schemas.ProjectCreate(name="P"))
+    tasks = [
+        crud.create_task(db, schemas.TaskCreate(project_id=project.id, title=title, status=status))
+        for title in titles
+    ]
+    return project.id, [task.id for task in tasks]
+
+
+def test_restore_brings_back_ids_and_order(db):
+    project_id, (a_id, b_id) = create_tasks(db, ["A", "B"])
+    child = crud.create_task(
+        db, schemas.TaskCreate(project_id=project_id, parent_task_id=b_id, title="B1", status="done")
+    )
+
+    archive = crud.archive_task(db, b_id)
+    assert archive.task_count == 2
+    assert [task.id for task in crud.get_tasks_by_project(db, project_id)] == [a_id]
+
+    new_task = crud.create_task(db, schemas.TaskCreate(project_id=project_id, title="C"))
+    assert new_task.id not in (b_id, child.id)
+
+    root = crud.restore_archive(db, archive.id)
+    assert (root.id, root.sort_order) == (b_id, 1)
+    assert crud.get_task(db, child.id).parent_task_id == b_id
+
+
+def test_migration_reserves_archived_ids(tmp_path):
+    path = tmp_path / "legacy.db"
+    engine = create_legacy_tables(path)
+    db = sessionmaker(autoflush=False, bind=engine)()
+    project_id, (_, b_id) = create_tasks(db, ["A", "B"])
+    archive_id = crud.archive_task(db, b_id).id
+    db.close()
+    engine.dispose()
+
+    migrate_tasks_autoincrement.migrate_database(str(path))
+
+    engine = create_engine(f"sqlite:///{path}")
+    db = sessionmaker(autoflush=False, bind=engine)()
+    new_task = crud.create_task(db, schemas.TaskCreate(project_id=project_id, title="C"))
+    assert new_task.id > b_id
+    assert crud.restore_archive(db, archive_id).id == b_id
+    db.close()
+    engine.dispose()
+
+
+def test_archive_requires_done_subtree(db):
+    _, (a_id,) = create_tasks(db, ["A"], status="backlog")
+    with pytest.raises(ValueError):
+        crud.archive_task(db, a_id)
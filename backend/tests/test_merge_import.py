@@ -0,0 +1,108 @@
+import time
+
+from app import crud, schemas
+
+
+def make_project(db, tasks):
+    project = crud.create_project(db, schemas.ProjectCreate(name="P"))
+    nodes = [schemas.ImportSubtask(**task) for task in tasks]
+    crud.merge_import_tasks(db, project.id, nodes)
+    return project.id
+
+
+def merge(db, project_id, tasks, **kwargs):
+    nodes = [schemas.ImportSubtask(**task) for task in tasks]
+    return crud.merge_import_tasks(db, project_id, nodes, **kwargs)
+
+
+def test_merge_keeps_ids_and_unmentioned_status(db):
+    project_id = make_project(db, [
+        {"title": "A", "subtasks": [{"title": "A1"}, {"title": "A2", "external_key": "k"}]},
+        {"title": "C"},
+    ])
+    ids = {task.title: task.id for task in crud.get_tasks_by_project(db, project_id)}
+    crud.update_task(db, ids["A1"], schemas.TaskUpdate(status="in_progress"))
+
+    result = merge(db, project_id, [
+        {"title": "A", "subtasks": [{"title": "A1"}]},
+        {"title": "D", "subtasks": [{"title": "A2 renamed", "external_key": "k"}]},
+    ])
+
+    assert [insert.path for insert in result.inserts] == ["D"]
+    assert [delete.task_id for delete in result.deletes] == [ids["C"]]
+    assert [move.task_id for move in result.moves] == [ids["A2"]]
+    tasks = {task.id: task for task in crud.get_tasks_by_project(db, project_id)}
+    assert tasks[ids["A1"]].status == "in_progress"
+    assert tasks[ids["A2"]].title == "A2 renamed"
+    assert tasks[tasks[ids["A2"]].parent_task_id].title == "D"
+    assert ids["C"] not in tasks
+
+
+def test_dry_run_changes_nothing(db):
+    project_id = make_project(db, [{"title": "A"}, {"title": "B"}])
+    result = merge(db, project_id, [{"title": "B"}, {"title": "X"}], dry_run=True)
+
+    assert len(result.inserts) == 1 and len(result.deletes) == 1
+    assert sorted(task.title for task in crud.get_tasks_by_project(db, project_id)) == ["A", "B"]
+
+
+def test_keyed_node_does_not_take_differently_keyed_sibling(db):
+    project_id = make_project(db, [{"title": "T", "external_key": "a"}, {"title": "T"}])
+    ids = [task.id for task in crud.get_root_tasks(db, project_id)]
+
+    result = merge(db, project_id, [{"title": "T", "external_key": "b"}], dry_run=True)
+
+    assert result.updates[0].task_id == ids[1]
+    assert result.updates[0].changes["external_key"] == "b"
+    assert [delete.task_id for delete in result.deletes] == [ids[0]]
+
+
+def test_wide_reordered_tree_dry_run_is_linear(db):
+    tasks = [{"title": f"T{n}"} for n in range(10000)]
+    project_id = make_project(db, tasks)
+
+    started = time.perf_counter()
+    result = merge(db, project_id, list(reversed(tasks)), dry_run=True)
+
+    assert time.perf_counter() - started < 5
+    assert not result.inserts and not result.deletes and not result.moves
+    assert len(result.updates) == 10000
+
+
+def test_merge_after_archive_does_not_duplicate_archived_work(db):
+    plan = [
+        {"title": "Open"},
+        {"title": "Done", "external_key": "d", "subtasks": [{"title": "x"}]},
+    ]
+    project_id = make_project(db, plan)
+    ids = {task.title: task.id for task in crud.get_tasks_by_project(db, project_id)}
+    for title in ("Done", "x"):
+        crud.update_task(db, ids[title], schemas.TaskUpdate(status="done"))
+    archive_id = crud.archive_task(db, ids["Done"]).id
+
+    result = merge(db, project_id, plan)
+    assert not result.inserts and not result.deletes
+    assert [(entry.task_id, entry.path) for entry in result.archived] == [(ids["Done"], "Done")]
+
+    # Matched by title too, when the plan has no keys
+    result = merge(db, project_id, [{"title": "Open"}, {"title": "Done"}], dry_run=True)
+    assert not result.inserts
+    assert [entry.task_id for entry in result.archived] == [ids["Done"]]
+
+    crud.restore_archive(db, archive_id)
+    assert sorted(task.title for task in crud.get_tasks_by_project(db, project_id)) == [
+        "Done", "Open", "x"
+    ]
+
+
+def test_merge_keeps_missing_parent_of_an_archive(db):
+    project_id = make_project(db, [{"title": "P", "subtasks": [{"title": "Done"}]}, {"title": "Q"}])
+    ids = {task.title: task.id for task in crud.get_tasks_by_project(db, project_id)}
+    crud.update_task(db, ids["Done"], schemas.TaskUpdate(status="done"))
+    archive_id = crud.archive_task(db, ids["Done"]).id
+
+    result = merge(db, project_id, [{"title": "Q"}])
+
+    assert [delete.task_id for delete in result.deletes] == []
+    assert [kept.task_id for kept in result.kept] == [ids["P"]]
+    assert crud.restore_archive(db, archive_id).parent_task_id == ids["P"]
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app import database, models
+
+
+@pytest.fixture
+def shard_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(database.settings, "storage_mode", "sharded")
+    monkeypatch.setattr(database.settings, "shard_directory", str(tmp_path))
+    monkeypatch.setattr(database, "_shard_engines", {})
+    yield str(tmp_path)
+    for shard_engine in database._shard_engines.values():
+        shard_engine.dispose()
+
+
+def sequences(shard_engine):
+    with shard_engine.connect() as conn:
+        return dict(conn.execute(text("SELECT name, seq FROM sqlite_sequence")).all())
+
+
+def test_new_shard_gets_all_sharded_tables(shard_directory):
+    shard_engine = database.get_shard_engine(3)
+
+    assert {"tasks", "task_archives"} <= set(inspect(shard_engine).get_table_names())
+    assert sequences(shard_engine) == {
+        "tasks": 3 * database.SHARD_ID_STRIDE,
+        "task_archives": 3 * database.SHARD_ID_STRIDE,
+    }
+
+
+def test_existing_shard_is_upgraded_on_open(shard_directory):
+    # A shard written before task_archives existed
+    old_engine = create_engine(f"sqlite:///{os.path.join(shard_directory, 'project_2.db')}")
+    models.Task.__table__.create(bind=old_engine)
+    with old_engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO tasks (project_id, title, status) VALUES (2, 'old', 'done')"
+        ))
+    old_engine.dispose()
+
+    shard_engine = database.get_shard_engine(2, create=False)
+
+    assert "task_archives" in inspect(shard_engine).get_table_names()
+    assert sequences(shard_engine)["task_archives"] == 2 * database.SHARD_ID_STRIDE
+    # The existing tasks sequence is left alone
+    assert sequences(shard_engine)["tasks"] == 1
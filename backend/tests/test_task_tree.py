@@ -0,0 +1,60 @@
+from app import crud, main, schemas
+
+
+def add(db, project_id, title, parent=None, **fields):
+    return crud.create_task(db, schemas.TaskCreate(
+        project_id=project_id, parent_task_id=parent, title=title, **fields
+    )).id
+
+
+def test_index_counts_and_leaf_minutes(db):
+    project_id = crud.create_project(db, schemas.ProjectCreate(name="P")).id
+    a = add(db, project_id, "A", estimated_minutes=999)
+    a1 = add(db, project_id, "A1", a, estimated_minutes=30)
+    a2 = add(db, project_id, "A2", a, estimated_minutes=60, status="done")
+    a1x = add(db, project_id, "A1x", a1, estimated_minutes=15)
+    b = add(db, project_id, "B", estimated_minutes=10)
+
+    children, descendants, leaf_minutes = crud.get_task_tree_index(db, project_id)
+
+    assert children[None] == [a, b]
+    assert children[a] == [a1, a2]
+    assert descendants == {a: 3, a1: 1, a2: 0, a1x: 0, b: 0}
+    # Done leaves don't count, parents sum their leaves instead of their own estimate
+    assert leaf_minutes[a] == 15
+    assert leaf_minutes[b] == 10
+
+
+def test_index_for_root_id_only_reads_the_subtree(db):
+    project_id = crud.create_project(db, schemas.ProjectCreate(name="P")).id
+    a = add(db, project_id, "A")
+    a1 = add(db, project_id, "A1", a)
+    a1x = add(db, project_id, "A1x", a1)
+    b = add(db, project_id, "B")
+
+    children, descendants, _ = crud.get_task_tree_index(db, project_id, root_id=a)
+
+    assert children[a] == [a1]
+    assert children[None] == [a]  # the root row itself; sibling B is never read
+    assert descendants == {a1: 1, a1x: 0}
+    assert b not in descendants
+
+
+def test_subtree_without_depth_only_loads_the_subtree(db, monkeypatch):
+    project_id = crud.create_project(db, schemas.ProjectCreate(name="P")).id
+    a = add(db, project_id, "A")
+    a1 = add(db, project_id, "A1", a)
+    a1x = add(db, project_id, "A1x", a1)
+    add(db, project_id, "B")
+
+    loaded = []
+    get_tasks_by_ids = crud.get_tasks_by_ids
+    monkeypatch.setattr(
+        crud, "get_tasks_by_ids",
+        lambda db, project_id, ids: loaded.extend(ids) or get_tasks_by_ids(db, project_id, ids)
+    )
+    tree = main._build_task_tree(db, project_id, a)
+
+    assert [node.id for node in tree] == [a1]
+    assert [node.id for node in tree[0].subtasks] == [a1x]
+    assert sorted(loaded) == sorted([a1, a1x])
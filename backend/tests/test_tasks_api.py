@@ -0,0 +1,39 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, schemas
+from app.database import RoutingSession, get_db
+from app.main import app
+
+
+@pytest.fixture
+def client(engine):
+    Session = sessionmaker(class_=RoutingSession, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_update_rejects_parent_from_another_project(client, db):
+    tasks = []
+    for name in ("P1", "P2"):
+        project_id = crud.create_project(db, schemas.ProjectCreate(name=name)).id
+        tasks.append(crud.create_task(db, schemas.TaskCreate(project_id=project_id, title="T")).id)
+    t1, t2 = tasks
+
+    response = client.put(f"/api/tasks/{t1}", json={"parent_task_id": t2})
+    assert response.status_code == 400
+    assert client.put(f"/api/tasks/{t1}", json={"parent_task_id": t2 + 100}).status_code == 404
+    assert client.get(f"/api/tasks/{t1}").json()["parent_task_id"] is None
+
+    with pytest.raises(ValueError):
+        crud.update_task(db, t1, schemas.TaskUpdate(parent_task_id=t2))
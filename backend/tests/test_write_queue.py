@@ -0,0 +1,159 @@
+import sqlite3
+import threading
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, schemas, write_queue
+from app.write_queue import GroupCommitSession, WriteQueue, WriteQueueError, _WriteOp
+
+
+@pytest.fixture
+def make_writer_session(engine):
+    return sessionmaker(
+        class_=GroupCommitSession, autoflush=False, expire_on_commit=False, bind=engine
+    )
+
+
+def count_projects(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM projects").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def create_project_op(name):
+    return _WriteOp(crud.create_project, (schemas.ProjectCreate(name=name),), {})
+
+
+def test_batch_not_visible_until_commit_batch(db_path, make_writer_session):
+    db = make_writer_session()
+    for name in ("a", "b"):
+        with db.begin_nested():
+            crud.create_project(db, schemas.ProjectCreate(name=name))
+
+    assert count_projects(db_path) == 0
+    db.commit_batch()
+    assert count_projects(db_path) == 2
+    db.close()
+
+
+def test_writes_in_a_batch_are_not_visible_mid_batch(db_path, make_writer_session):
+    queue = WriteQueue(make_writer_session)
+    db = make_writer_session()
+    ops = [
+        create_project_op("a"),
+        _WriteOp(lambda db: count_projects(db_path), (), {}),
+        create_project_op("b"),
+    ]
+    queue._apply_batch(db, ops)
+
+    assert ops[0].future.result().name == "a"
+    assert ops[1].future.result() == 0
+    assert count_projects(db_path) == 2
+    db.close()
+
+
+def test_failed_write_only_fails_its_caller(db_path, make_writer_session):
+    queue = WriteQueue(make_writer_session)
+    db = make_writer_session()
+
+    def failing(db):
+        crud.create_project(db, schemas.ProjectCreate(name="bad"))
+        raise ValueError("boom")
+
+    ops = [create_project_op("a"), _WriteOp(failing, (), {}), create_project_op("c")]
+    queue._apply_batch(db, ops)
+
+    assert ops[0].future.result().name == "a"
+    with pytest.raises(ValueError):
+        ops[1].future.result()
+    assert ops[2].future.result().name == "c"
+    assert count_projects(db_path) == 2
+    db.close()
+
+
+def test_failed_commit_rolls_back_whole_batch(db_path, make_writer_session):
+    queue = WriteQueue(make_writer_session)
+    db = make_writer_session()
+
+    def failing_commit():
+        raise RuntimeError("disk full")
+
+    db.commit_batch = failing_commit
+    ops = [create_project_op("a"), create_project_op("b")]
+    queue._apply_batch(db, ops)
+
+    for op in ops:
+        with pytest.raises(RuntimeError):
+            op.future.result()
+    assert count_projects(db_path) == 0
+    db.close()
+
+
+def test_queue_returns_each_callers_result(db_path, make_writer_session):
+    queue = WriteQueue(make_writer_session)
+    queue.start()
+    try:
+        futures = [
+            queue.submit(crud.create_project, schemas.ProjectCreate(name=f"p{n}"))
+            for n in range(20)
+        ]
+        assert [future.result().name for future in futures] == [f"p{n}" for n in range(20)]
+    finally:
+        queue.stop()
+    assert count_projects(db_path) == 20
+    assert queue.stats()["operations"] == 20
+
+
+def test_writer_survives_a_failing_batch(db_path, make_writer_session):
+    sessions = []
+
+    def session_factory():
+        db = make_writer_session()
+        sessions.append(db)
+        return db
+
+    queue = WriteQueue(session_factory)
+    queue.start()
+    try:
+        def broken_expunge():
+            raise RuntimeError("session is broken")
+
+        # Fails outside the per-write error handling
+        sessions[0].expunge_all = broken_expunge
+        future = queue.submit(crud.create_project, schemas.ProjectCreate(name="a"))
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+
+        # The writer is still running, on a fresh session
+        future = queue.submit(crud.create_project, schemas.ProjectCreate(name="b"))
+        assert future.result(timeout=5).name == "b"
+        assert len(sessions) == 2
+    finally:
+        queue.stop()
+
+
+def test_submit_fails_once_the_writer_is_gone(make_writer_session):
+    queue = WriteQueue(make_writer_session)
+    queue.start()
+    queue._queue.put(write_queue._STOP)
+    queue._thread.join()
+
+    with pytest.raises(WriteQueueError):
+        queue.submit(crud.create_project, schemas.ProjectCreate(name="a"))
+
+
+def test_run_write_times_out(make_writer_session, monkeypatch):
+    queue = WriteQueue(make_writer_session)
+    monkeypatch.setattr(write_queue, "write_queue", queue)
+    monkeypatch.setattr(write_queue.settings, "write_queue_timeout", 0.05)
+    release = threading.Event()
+    queue.start()
+    try:
+        with pytest.raises(WriteQueueError):
+            write_queue.run_write(None, lambda db: release.wait(5))
+    finally:
+        release.set()
+        queue.stop()
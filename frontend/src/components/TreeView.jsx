@@ -10,6 +10,7 @@ import {
 } from 'lucide-react'
 import {
   getProjectTaskTree,
+  getTaskChildren,
   createTask,
   updateTask,
   deleteTask
@@ -34,6 +35,9 @@ const getStatusColor = (status) => {
   return 'text-purple-400' // default for custom statuses
 }
 
+// Levels loaded per request; deeper levels load when a node is expanded
+const TREE_DEPTH = 2
+
 const FLAG_COLORS = {
   red: 'bg-red-500',
   orange: 'bg-orange-500',
@@ -45,13 +49,38 @@ const FLAG_COLORS = {
 }
 
 function TaskNode({ task, projectId, onUpdate, level = 0, projectStatuses }) {
-  const [isExpanded, setIsExpanded] = useState(true)
+  const [isExpanded, setIsExpanded] = useState(!task.has_more)
   const [isEditing, setIsEditing] = useState(false)
   const [editTitle, setEditTitle] = useState(task.title)
   const [editStatus, setEditStatus] = useState(task.status)
   const [showAddSubtask, setShowAddSubtask] = useState(false)
+  // Children fetched on expand, for nodes that came back with has_more
+  const [loadedSubtasks, setLoadedSubtasks] = useState(null)
+
+  const subtasks = loadedSubtasks || task.subtasks || []
+  const hasSubtasks = task.child_count > 0 || subtasks.length > 0
+
+  const loadSubtasks = async () => {
+    try {
+      setLoadedSubtasks(await getTaskChildren(task.id, TREE_DEPTH))
+    } catch (err) {
+      alert(`Error: ${err.message}`)
+    }
+  }
 
-  const hasSubtasks = task.subtasks && task.subtasks.length > 0
+  useEffect(() => {
+    if (isExpanded && task.has_more && !loadedSubtasks) {
+      loadSubtasks()
+    }
+  }, [isExpanded, task.has_more])
+
+  // Lazily loaded children are not part of the parent's data, so refresh them here too
+  const handleSubtaskUpdate = async () => {
+    if (loadedSubtasks) {
+      await loadSubtasks()
+    }
+    onUpdate()
+  }
 
   const handleSave = async () => {
     try {
@@ -90,7 +119,7 @@ function TaskNode({ task, projectId, onUpdate, level = 0, projectStatuses }) {
       })
       setShowAddSubtask(false)
       setIsExpanded(true)
-      onUpdate()
+      handleSubtaskUpdate()
     } catch (err) {
       alert(`Error: ${err.message}`)
     }
@@ -232,14 +261,14 @@ function TaskNode({ task, projectId, onUpdate, level = 0, projectStatuses }) {
       )}
 
       {/* Subtasks */}
-      {isExpanded && hasSubtasks && (
+      {isExpanded && subtasks.length > 0 && (
         <div className="mt-2">
-          {task.subtasks.map(subtask => (
+          {subtasks.map(subtask => (
             <TaskNode
               key={subtask.id}
               task={subtask}
               projectId={projectId}
-              onUpdate={onUpdate}
+              onUpdate={handleSubtaskUpdate}
               level={level + 1}
               projectStatuses={projectStatuses}
             />
@@ -258,13 +287,14 @@ function TreeView({ projectId, project }) {
   const [showAddRoot, setShowAddRoot] = useState(false)
 
   useEffect(() => {
+    setLoading(true)
     loadTasks()
   }, [projectId])
 
+  // Reloads keep the tree mounted so lazily expanded nodes stay open
   const loadTasks = async () => {
     try {
-      setLoading(true)
-      const data = await getProjectTaskTree(projectId)
+      const data = await getProjectTaskTree(projectId, { depth: TREE_DEPTH })
       setTasks(data)
     } catch (err) {
       setError(err.message)
@@ -36,11 +36,18 @@ export const deleteProject = (id) => fetchAPI(`/projects/${id}`, { method: 'DELE
 
 // Tasks
 export const getProjectTasks = (projectId) => fetchAPI(`/projects/${projectId}/tasks`);
-export const getProjectTaskTree = (projectId) => fetchAPI(`/projects/${projectId}/tasks/tree`);
+export const getProjectTaskTree = (projectId, { depth = null, rootId = null } = {}) => {
+  const params = new URLSearchParams();
+  if (depth) params.append('depth', depth);
+  if (rootId) params.append('root_id', rootId);
+  const query = params.toString();
+  return fetchAPI(`/projects/${projectId}/tasks/tree${query ? `?${query}` : ''}`);
+};
 export const getTasksByStatus = (projectId, status) =>
   fetchAPI(`/projects/${projectId}/tasks/by-status/${status}`);
 
 export const getTask = (id) => fetchAPI(`/tasks/${id}`);
+export const getTaskChildren = (id, depth = 1) => fetchAPI(`/tasks/${id}/children?depth=${depth}`);
 export const createTask = (data) => fetchAPI('/tasks', {
   method: 'POST',
   body: JSON.stringify(data),
@@ -51,11 +58,22 @@ export const updateTask = (id, data) => fetchAPI(`/tasks/${id}`, {
 });
 export const deleteTask = (id) => fetchAPI(`/tasks/${id}`, { method: 'DELETE' });
 
+// Archive
+export const archiveTask = (id) => fetchAPI(`/tasks/${id}/archive`, { method: 'POST' });
+export const archiveProject = (projectId) => fetchAPI(`/projects/${projectId}/archive`, { method: 'POST' });
+export const getProjectArchives = (projectId) => fetchAPI(`/projects/${projectId}/archives`);
+export const restoreArchive = (archiveId) => fetchAPI(`/archives/${archiveId}/restore`, { method: 'POST' });
+
 // JSON Import
 export const importJSON = (data) => fetchAPI('/import-json', {
   method: 'POST',
   body: JSON.stringify(data),
 });
+export const mergeImportJSON = (projectId, data, dryRun = false) =>
+  fetchAPI(`/projects/${projectId}/import-json/merge?dry_run=${dryRun}`, {
+    method: 'POST',
+    body: JSON.stringify(data),
+  });
 
 // Search
 export const searchTasks = (query, projectIds = null) => {
@@ -60,11 +60,13 @@ export function calculateLeafTimeFlat(task, allTasks) {
 }
 
 // Format time display based on leaf calculation logic
+// Tree nodes from the API carry child_count and leaf_minutes, which also
+// cover children that have not been loaded yet
 export function formatTimeWithTotal(task, allTasks = null) {
   // Check if task has subtasks
   const hasSubtasks = allTasks
     ? allTasks.some(t => t.parent_task_id === task.id)
-    : (task.subtasks && task.subtasks.length > 0);
+    : (task.child_count > 0 || (task.subtasks && task.subtasks.length > 0));
 
   // Leaf task: use own estimate
   if (!hasSubtasks) {
@@ -74,7 +76,7 @@ export function formatTimeWithTotal(task, allTasks = null) {
   // Parent task: calculate sum of leaf descendants
   const leafTotal = allTasks
     ? calculateLeafTimeFlat(task, allTasks)
-    : calculateLeafTime(task);
+    : (task.leaf_minutes ?? calculateLeafTime(task));
 
   // If no leaf estimates exist, fall back to own estimate
   if (leafTotal === 0) {